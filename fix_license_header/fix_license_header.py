@@ -17,58 +17,206 @@ initial comments in the file with the given header.
 
 import argparse
 import datetime
+import functools
+import os
 import re
 import sys
 
+# Match the first copyright year or year range in each line, e.g.
+# "Copyright (c) 2021-2025".
+_COPYRIGHT_RE = re.compile(
+    r'^[^\n]*?copyright[^\d\n]*(\d+)(?:-(\d+))?', re.IGNORECASE | re.MULTILINE
+)
 
-def fix_file(f, header_lines, prefix, keep_before, keep_after):
-    """Fix one file.
+# Group prefixes by their first byte when there are more than this many.
+_PREFIX_BUCKET_THRESHOLD = 8
 
-    Return 0 if the file is not modified, 1 if it is.
+
+def _prefix_matcher(prefixes):
+    """Build a function that checks if a line starts with any of ``prefixes``.
+
+    Small sets of prefixes are checked with one tuple `bytes.startswith` call.
+    Larger sets are grouped by first byte so that each line is only compared
+    against the prefixes that can match it.
     """
-    line = f.readline()
-    if line.endswith(b'\r\n'):
-        line_ending = b'\r\n'
-    else:
-        line_ending = b'\n'
-
-    before = b''
-    after = b''
-    file_header = []
-    while line.startswith(prefix) or any([line.startswith(s) for s in keep_before]):
-        if any([line.startswith(s) for s in keep_before]):
-            before += line
-        elif any([line.startswith(s) for s in keep_after]):
-            after += line
+    prefixes = tuple(prefixes)
+    if len(prefixes) <= _PREFIX_BUCKET_THRESHOLD:
+
+        def match(line):
+            return line.startswith(prefixes)
+
+        return match
+
+    buckets = {}
+    for prefix in prefixes:
+        buckets.setdefault(prefix[:1], []).append(prefix)
+    buckets = {first: tuple(bucket) for first, bucket in buckets.items()}
+    # the empty prefix matches every line
+    empty = buckets.pop(b'', ())
+
+    def match(line):
+        return line.startswith(empty) or line.startswith(buckets.get(line[:1], ()))
+
+    return match
+
+
+def _expected_header(header_lines, prefix, keep_before, keep_after):
+    """Build the leading bytes of a file that already has the correct header.
+
+    Return None when a file starting with these bytes may still need to be
+    rewritten by `fix_file`.
+    """
+    lines = [prefix + line for line in header_lines]
+    keep = tuple(keep_before) + tuple(keep_after)
+    for header_line, line in zip(header_lines, lines):
+        if header_line != header_line.strip() or line.startswith(keep):
+            return None
+
+    return b''.join(line + b'\n' for line in lines) + b'\n'
+
+
+@functools.lru_cache(maxsize=16)
+def _make_fixer(header_lines, prefix, keep_before, keep_after):
+    """Build a function that fixes the header in the contents of one file.
+
+    Everything that depends only on the settings is computed here once, not
+    once per file. The arguments must be hashable (use tuples for the lists).
+
+    The returned function takes the file contents and returns None when the
+    header is correct. Otherwise, it returns ``(head, length)``: the fixed file
+    is ``head`` followed by the contents after the first ``length`` bytes.
+    """
+    num_lines = len(header_lines)
+    prefix_length = len(prefix)
+    # Header lines with surrounding whitespace never match a stripped line, so
+    # they have no expected line to compare exactly against.
+    expected_lines = tuple(
+        prefix + line if line == line.strip() else None for line in header_lines
+    )
+    is_before = _prefix_matcher(keep_before)
+    is_after = _prefix_matcher(keep_after)
+
+    def fix_bytes(contents):
+        # walk the lines of the contents in memory
+        start = 0
+        # find returns -1 when there is no line ending, so take the rest of the file
+        end = contents.find(b'\n', start) + 1 or len(contents)
+        line = contents[start:end]
+        if line.endswith(b'\r\n'):
+            line_ending = b'\r\n'
         else:
-            file_header.append(line[len(prefix) :].strip())
-        line = f.readline()
+            line_ending = b'\n'
+
+        before = []
+        after = []
+        # compare header lines as they are found, stopping at the first mismatch
+        num_header_lines = 0
+        header_matches = True
+        while True:
+            # skip the keep prefix checks entirely when none are given (the default)
+            keep_line_before = bool(keep_before) and is_before(line)
+            if not keep_line_before and not line.startswith(prefix):
+                break
+
+            if keep_line_before:
+                before.append(line)
+            elif keep_after and is_after(line):
+                after.append(line)
+            else:
+                if header_matches:
+                    header_matches = num_header_lines < num_lines and (
+                        line.rstrip(b'\r\n') == expected_lines[num_header_lines]
+                        or line[prefix_length:].strip()
+                        == header_lines[num_header_lines]
+                    )
+                num_header_lines += 1
+            start = end
+            end = contents.find(b'\n', start) + 1 or len(contents)
+            line = contents[start:end]
+
+        # the remaining contents of the file start at `start`
+        blank_line_follows = start == len(contents) or contents.startswith(
+            line_ending, start
+        )
+
+        # check if the header is correct
+        if header_matches and num_header_lines == num_lines and blank_line_follows:
+            return None
 
-    # read the contents of the file
-    file_contents = line + f.read()
+        # header doesn't match, build the replacement
+        head = bytearray()
+        head += b''.join(before)
+        for line in header_lines:
+            head += prefix + line + line_ending
+        if after:
+            head += line_ending
+            head += b''.join(after)
+        if not blank_line_follows:
+            head += line_ending
 
-    # check if the header is correct
-    if file_header == header_lines and (
-        file_contents == b'' or file_contents.startswith(line_ending)
-    ):
+        return head, start
+
+    return fix_bytes
+
+
+def _fix_open_file(f, fix_bytes):
+    """Fix one open file with a function built by `_make_fixer`.
+
+    Return 0 if the file is not modified, 1 if it is.
+    """
+    contents = f.read()
+    fixed = fix_bytes(contents)
+    if fixed is None:
         return 0
 
     # header doesn't match, rewrite file
+    head, start = fixed
     f.seek(0)
-    f.truncate()
-    f.write(before)
-    for line in header_lines:
-        f.write(prefix + line + line_ending)
-    if len(after) > 0:
-        f.write(line_ending)
-        f.write(after)
-    if len(file_contents) > 0 and not file_contents.startswith(line_ending):
-        f.write(line_ending)
-    f.write(file_contents)
+    if len(head) == start:
+        # the body stays in place, only overwrite the header
+        f.write(head)
+    else:
+        # write the new contents in one call, then drop any leftover old bytes
+        head += memoryview(contents)[start:]
+        f.write(head)
+        f.truncate()
 
     return 1
 
 
+def fix_file(f, header_lines, prefix, keep_before, keep_after):
+    """Fix one file.
+
+    Return 0 if the file is not modified, 1 if it is.
+    """
+    fix_bytes = _make_fixer(
+        tuple(header_lines), prefix, tuple(keep_before), tuple(keep_after)
+    )
+    return _fix_open_file(f, fix_bytes)
+
+
+def _fix_filename(filename, fix_bytes, expected=None):
+    """Open and fix one file with a function built by `_make_fixer`.
+
+    When provided, files that start with ``expected`` (see `_expected_header`)
+    are not parsed.
+
+    Return 0 if the file is not modified, 1 if it is.
+    """
+    # O_BINARY prevents newline translation on Windows
+    fd = os.open(filename, os.O_RDWR | getattr(os, 'O_BINARY', 0))
+    try:
+        # check unmodified files with the raw file descriptor
+        if expected is not None and os.read(fd, len(expected)) == expected:
+            return 0
+
+        os.lseek(fd, 0, os.SEEK_SET)
+        with open(fd, 'r+b', closefd=False) as f:
+            return _fix_open_file(f, fix_bytes)
+    finally:
+        os.close(fd)
+
+
 # These mappings are used for when no filetype is provided
 file_type_comment_map = {
     'asm': ';',  # Assembly
@@ -158,23 +306,19 @@ def main(argv=None):
         for line in args.add:
             header_lines.append(line.encode('utf-8'))
 
-    for line in header_lines:
-        match = re.search(
-            r'copyright[\D]*\d+-(\d+)', line.decode('utf-8'), flags=re.IGNORECASE
-        )
-
-        if match is None:
-            match = re.search(
-                r'copyright[\D]*(\d+)', line.decode('utf-8'), flags=re.IGNORECASE
+    current_year = datetime.date.today().year
+    warnings = []
+    # search all header lines in one pass
+    for match in _COPYRIGHT_RE.finditer(b'\n'.join(header_lines).decode('utf-8')):
+        # Check the end of the year range when present.
+        copyright_year = int(match.group(2) or match.group(1))
+        if copyright_year != current_year:
+            warnings.append(
+                f'warning: The copyright year {copyright_year} is not current.'
             )
 
-        if match is not None:
-            copyright_year = int(match.group(1))
-            if copyright_year != datetime.datetime.now().year:
-                print(
-                    f'warning: The copyright year {copyright_year} is not current.',
-                    file=sys.stderr,
-                )
+    if warnings:
+        sys.stderr.write('\n'.join(warnings) + '\n')
 
     keep_before = []
     if args.keep_before is not None:
@@ -184,12 +328,23 @@ def main(argv=None):
     if args.keep_after is not None:
         keep_after = [s.encode('utf-8') for s in args.keep_after]
 
+    # encode the comment prefixes once instead of once per file
+    if args.comment_prefix is None:
+        encoded_prefixes = {
+            extension: comment.encode('utf-8') + b' '
+            for extension, comment in file_type_comment_map.items()
+        }
+    else:
+        fixed_prefix = args.comment_prefix.encode('utf-8') + b' '
+
+    # build the fixer and expected header once per comment prefix
+    fixers = {}
     return_value = 0
     for filename in args.filenames:
         if args.comment_prefix is None:
             # Parse to search for stored comment prefix for that file type.
-            extension = filename.split('.')[-1]
-            prefix = file_type_comment_map.get(extension, None)
+            extension = filename.rpartition('.')[2]
+            prefix = encoded_prefixes.get(extension, None)
             if prefix is None:
                 error_str = (
                     f'Comment format not detected for file with extension {extension}.'
@@ -198,18 +353,24 @@ def main(argv=None):
                 raise ValueError(error_str)
                 continue
         else:
-            prefix = args.comment_prefix
-        with open(filename, 'r+b') as f:
-            status = fix_file(
-                f=f,
-                header_lines=header_lines,
-                prefix=prefix.encode('utf-8') + b' ',
-                keep_before=keep_before,
-                keep_after=keep_after,
+            prefix = fixed_prefix
+        if prefix not in fixers:
+            fixers[prefix] = (
+                _make_fixer(
+                    tuple(header_lines), prefix, tuple(keep_before), tuple(keep_after)
+                ),
+                _expected_header(
+                    header_lines=header_lines,
+                    prefix=prefix,
+                    keep_before=keep_before,
+                    keep_after=keep_after,
+                ),
             )
-            return_value |= status
-            if status:
-                print(f'Updated license header in {filename}')
+        fix_bytes, expected = fixers[prefix]
+        status = _fix_filename(filename, fix_bytes, expected)
+        return_value |= status
+        if status:
+            print(f'Updated license header in {filename}')
 
     sys.exit(return_value)
 